@@ -5,6 +5,11 @@ from functools import lru_cache
 class Settings(BaseSettings):
     # Database
     database_url: str = "sqlite:///./clawnema.db"
+    database_replica_urls: str = ""  # comma-separated read replicas
+    replica_max_lag_seconds: float = 5.0
+    replica_sticky_seconds: float = 5.0
+    replica_check_interval_seconds: float = 2.0
+    replica_connect_timeout_seconds: int = 2
 
     # Trio API
     trio_api_key: str = ""
@@ -15,6 +20,11 @@ class Settings(BaseSettings):
     coinbase_cdp_api_secret: str = ""
     coinbase_network: str = "base"
 
+    # Pre-created agentic wallet pool (0 disables)
+    wallet_pool_size: int = 20
+    wallet_pool_refill_concurrency: int = 4
+    wallet_pool_refill_interval_seconds: float = 30.0
+
     # x402 Payment
     x402_facilitator_url: str = "https://x402.facilitator.com"
     x402_network: str = "base"
@@ -23,6 +33,53 @@ class Settings(BaseSettings):
     openclaw_webhook_secret: str = ""
     openclaw_api_key: str = ""
 
+    # Server-side stream ingestion
+    ingest_keyframes_only: bool = True
+    ingest_sample_fps: float = 1.0
+    ingest_queue_size: int = 32
+    ingest_allow_local_files: bool = False  # local testing only
+    ingest_max_readers: int = 16  # concurrent stream decoders per worker
+    ingest_open_timeout_seconds: float = 10.0
+    ingest_read_timeout_seconds: float = 15.0
+
+    # Frame preprocessing before Trio upload
+    preprocess_enabled: bool = True
+    preprocess_workers: int = 0  # 0 = one per CPU
+    preprocess_max_pending: int = 64
+    trio_max_image_size: int = 768
+    trio_jpeg_quality: int = 80
+
+    # Watch socket limits (per worker)
+    ws_max_connections: int = 20000
+    ws_max_connections_per_agent: int = 5
+    ws_ping_interval_seconds: float = 20.0
+    ws_idle_timeout_seconds: float = 60.0
+    ws_send_buffer_bytes: int = 256 * 1024
+    ws_max_message_bytes: int = 4 * 1024 * 1024  # also passed as uvicorn ws_max_size
+
+    # Idempotency-Key response store (per worker)
+    idempotency_max_entries: int = 10000
+    idempotency_ttl_seconds: float = 24 * 60 * 60
+
+    # Watch session record/replay logs (empty dir disables)
+    session_log_dir: str = ""
+    session_log_frames: bool = False  # keep raw frames, not just their hashes
+
+    # Spend ledger batching
+    ledger_batch_size: int = 500
+    ledger_flush_interval_seconds: float = 1.0
+
+    # Ticket expiry
+    ticket_expiry_sweep_interval_seconds: float = 60.0
+    ticket_expiry_batch_size: int = 1000
+    expiry_wheel_tick_seconds: float = 1.0
+    expiry_wheel_slots: int = 3600
+
+    # On-demand profiling (empty token disables)
+    profiling_token: str = ""
+    profiling_interval_ms: float = 5.0
+    profiling_max_profiles: int = 100
+
     # App
     environment: str = "development"
     secret_key: str = "dev-secret-change-in-production"
@@ -0,0 +1,69 @@
+import math
+import time
+from typing import Optional
+
+from sqlalchemy.orm import Session
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from models.database import ReadSessionLocal, RequestWrites, SessionLocal, request_writes
+
+LAST_WRITE_HEADER = "x-clawnema-last-write"
+LAST_WRITE_COOKIE = "clawnema_last_write"
+
+
+class ReadYourWritesMiddleware:
+    """Marks responses to requests that committed writes
+
+    The commit time goes out as an X-Clawnema-Last-Write header and a
+    cookie. A client that sends either back within sticky_seconds has its
+    reads served by the primary, on whichever worker it lands, so it sees
+    its own writes even when replicas lag.
+    """
+
+    def __init__(self, app: ASGIApp, sticky_seconds: float):
+        self.app = app
+        self.sticky_seconds = sticky_seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        writes = RequestWrites()
+        reset = request_writes.set(writes)
+
+        async def send_with_marker(message: Message) -> None:
+            if message["type"] == "http.response.start" and writes.written_at is not None:
+                value = f"{writes.written_at:.3f}"
+                cookie = (
+                    f"{LAST_WRITE_COOKIE}={value}; Max-Age={math.ceil(self.sticky_seconds)}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                headers = list(message.get("headers", []))
+                headers.append((LAST_WRITE_HEADER.encode(), value.encode()))
+                headers.append((b"set-cookie", cookie.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_marker)
+        finally:
+            request_writes.reset(reset)
+
+
+def wrote_recently(last_write: Optional[str], sticky_seconds: float) -> bool:
+    try:
+        written_at = float(last_write)
+    except (TypeError, ValueError):
+        return False
+    # Tolerates small clock skew between workers in either direction
+    return abs(time.time() - written_at) < sticky_seconds
+
+
+def read_session(connection: HTTPConnection, sticky_seconds: float) -> Session:
+    """Replica-routed session, or a primary one if this client just wrote"""
+    last_write = connection.headers.get(LAST_WRITE_HEADER) or connection.cookies.get(LAST_WRITE_COOKIE)
+    if wrote_recently(last_write, sticky_seconds):
+        return SessionLocal()
+    return ReadSessionLocal()
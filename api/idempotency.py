@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# (status, headers, body) of a completed response
+StoredResponse = Tuple[int, List[Tuple[bytes, bytes]], bytes]
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "future", "expires_at")
+
+    def __init__(self, fingerprint: str, expires_at: float):
+        self.fingerprint = fingerprint
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.expires_at = expires_at
+
+
+class IdempotencyStore:
+    """Bounded, TTL-evicted store of responses keyed by Idempotency-Key
+
+    Entries are kept in insertion order, which with a fixed TTL is also
+    expiry order, so eviction only ever looks at the oldest entries.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+
+    def begin(self, key: Tuple[str, str], fingerprint: str) -> Tuple[_Entry, bool]:
+        """Return (entry, is_owner); the owner must call complete() or fail()"""
+        now = time.monotonic()
+        self._evict(now)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry, False
+
+        entry = _Entry(fingerprint, now + self.ttl_seconds)
+        self._entries[key] = entry
+        return entry, True
+
+    def complete(self, key: Tuple[str, str], response: StoredResponse) -> None:
+        entry = self._entries.get(key)
+        if entry is not None and not entry.future.done():
+            entry.future.set_result(response)
+
+    def fail(self, key: Tuple[str, str]) -> None:
+        """Drop an entry whose request errored so a retry runs it again"""
+        entry = self._entries.pop(key, None)
+        if entry is not None and not entry.future.done():
+            entry.future.set_result(None)
+
+    def _evict(self, now: float) -> None:
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            expired = entry.expires_at <= now
+            over_capacity = len(self._entries) >= self.max_entries
+
+            if not (expired or over_capacity) or not entry.future.done():
+                # Never evict in-flight requests; their waiters hold the future
+                break
+            del self._entries[key]
+
+
+class IdempotencyMiddleware:
+    """Replays stored responses for POSTs that repeat an Idempotency-Key
+
+    A duplicate that arrives while the first request is still running waits
+    for it. Reusing a key with a different body gets 422. Only responses
+    below 500 are stored, so a failed request can be retried.
+    """
+
+    def __init__(self, app: ASGIApp, paths: Iterable[str], max_entries: int, ttl_seconds: float):
+        self.app = app
+        self.paths = set(paths)
+        self.store = IdempotencyStore(max_entries, ttl_seconds)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        idempotency_key = headers.get(b"idempotency-key")
+        if not idempotency_key:
+            await self.app(scope, receive, send)
+            return
+
+        body = await _read_body(receive)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        key = (scope["path"], idempotency_key.decode("latin-1"))
+
+        while True:
+            entry, is_owner = self.store.begin(key, fingerprint)
+
+            if entry.fingerprint != fingerprint:
+                await _send_response(send, (
+                    422,
+                    [(b"content-type", b"application/json")],
+                    b'{"detail":"Idempotency-Key reused with a different request body"}'
+                ))
+                return
+
+            if is_owner:
+                break
+
+            stored = await asyncio.shield(entry.future)
+            if stored is not None:
+                status, stored_headers, stored_body = stored
+                await _send_response(
+                    send,
+                    (status, stored_headers + [(b"idempotent-replayed", b"true")], stored_body)
+                )
+                return
+            # The first attempt failed; run this one for real
+
+        await self._run_and_store(scope, body, send, key)
+
+    async def _run_and_store(self, scope: Scope, body: bytes, send: Send, key: Tuple[str, str]) -> None:
+        status = 500
+        response_headers: List[Tuple[bytes, bytes]] = []
+        chunks: List[bytes] = []
+        body_sent = False
+
+        async def replay_receive() -> Message:
+            nonlocal body_sent
+            if body_sent:
+                # Nothing left to read; block like a client that stays connected
+                await asyncio.Future()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def capture_send(message: Message) -> None:
+            nonlocal status, response_headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            self.store.fail(key)
+            raise
+
+        if status < 500:
+            self.store.complete(key, (status, response_headers, b"".join(chunks)))
+        else:
+            self.store.fail(key)
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+async def _send_response(send: Send, response: StoredResponse) -> None:
+    status, headers, body = response
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
@@ -1,28 +1,43 @@
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, status
-from fastapi.responses import JSONResponse
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from typing import List, Optional
+import asyncio
 import uuid
 from datetime import datetime, timedelta
 
 from api.config import settings
+from api.consistency import ReadYourWritesMiddleware, read_session
+from api.idempotency import IdempotencyMiddleware
+from api.profiling import ProfilingMiddleware, profiler, profiling_authorized
 from models.database import (
-    Base, engine, SessionLocal, Agent, Ticket, Digest, Stream
+    Base, engine, SessionLocal, Agent, Ticket, Digest, Stream, router as replica_router
 )
+from models.search import create_digest_search_index, index_digest, search_digests
 from models.schemas import (
-    AgentCreate, AgentResponse,
+    AgentCreate, AgentResponse, AgentSpendResponse,
     TicketPurchaseRequest, TicketResponse,
     DigestCreate, DigestResponse,
+    DigestSearchResult, DigestSearchResponse,
     StreamCreate, StreamResponse,
     TrioAnalysisResponse
 )
 from services.trio_service import trio_service
 from services.payment_service import x402_service
 from services.notification_service import notification_service
+from services.ingest_service import ingest_service
+from services.preprocess_service import frame_preprocessor
+from services.connection_service import connection_manager
+from services.wallet_pool_service import wallet_pool
+from services.watch_service import FrameAcker, WatchSession
+from services.session_log import SessionLogWriter
+from services.spend_ledger import MICRO_USDC, ALL_TIME, spend_ledger
+from services.expiry_service import ticket_expiry
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+create_digest_search_index(engine)
 
 app = FastAPI(
     title="Clawnema API",
@@ -30,6 +45,17 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Replay retried POSTs that carry an Idempotency-Key header
+app.add_middleware(
+    IdempotencyMiddleware,
+    paths=["/agents", "/tickets/purchase", "/digests/create"],
+    max_entries=settings.idempotency_max_entries,
+    ttl_seconds=settings.idempotency_ttl_seconds,
+)
+
+# Tell clients when they wrote so their next reads skip lagging replicas
+app.add_middleware(ReadYourWritesMiddleware, sticky_seconds=settings.replica_sticky_seconds)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -39,6 +65,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in per-request profiling (X-Clawnema-Profile: <PROFILING_TOKEN>)
+app.add_middleware(ProfilingMiddleware)
+
+
+@app.on_event("startup")
+async def startup():
+    replica_router.start()
+    wallet_pool.start()
+    spend_ledger.start()
+    ticket_expiry.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    replica_router.stop()
+    wallet_pool.stop()
+    ticket_expiry.stop()
+    await spend_ledger.stop()
+    frame_preprocessor.shutdown()
+
 
 def get_db():
     db = SessionLocal()
@@ -48,6 +94,20 @@ def get_db():
         db.close()
 
 
+def get_read_db(request: Request):
+    """Per-request session whose reads may be served by a replica"""
+    db = read_session(request, settings.replica_sticky_seconds)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def require_profiling_token(x_clawnema_profile: Optional[str] = Header(None)):
+    if not profiling_authorized(x_clawnema_profile):
+        raise HTTPException(status_code=403, detail="Profiling not authorized")
+
+
 # ==================== AGENT ENDPOINTS ====================
 
 @app.post("/agents", response_model=AgentResponse)
@@ -59,15 +119,18 @@ async def create_agent(agent_data: AgentCreate, db: Session = next(get_db())):
     if existing:
         raise HTTPException(status_code=400, detail="Agent already registered")
 
-    # Create agentic wallet if not provided
-    if not agent_data.wallet_address:
-        wallet_response = await x402_service.create_agentic_wallet(agent_data.agent_id)
-        wallet_address = wallet_response.get("wallet_address")
-    else:
+    if agent_data.wallet_address:
         wallet_address = agent_data.wallet_address
+        balance = await x402_service.get_wallet_balance(wallet_address)
+    else:
+        # Brand-new wallets always start empty, so no balance lookup is needed
+        balance = 0.0
+        wallet_address = wallet_pool.claim(db, agent_data.agent_id)
 
-    # Get USDC balance
-    balance = await x402_service.get_wallet_balance(wallet_address)
+        if wallet_address is None:
+            # Pool exhausted or disabled: create one on the request path
+            wallet_response = await x402_service.create_agentic_wallet(agent_data.agent_id)
+            wallet_address = wallet_response.get("wallet_address")
 
     agent = Agent(
         id=str(uuid.uuid4()),
@@ -101,10 +164,26 @@ async def get_agent(agent_id: str, db: Session = next(get_db())):
     return agent
 
 
+@app.get("/agents/{agent_id}/spend", response_model=AgentSpendResponse)
+async def get_agent_spend(agent_id: str, db: Session = Depends(get_db)):
+    """Today's and lifetime spend for an agent, read from the ledger rollups"""
+
+    today = await spend_ledger.spent_today(db, agent_id)
+    total = await spend_ledger.spent(db, "agent", agent_id, ALL_TIME)
+
+    return {
+        "agent_id": agent_id,
+        "today_micro_usdc": today,
+        "total_micro_usdc": total,
+        "today_usdc": today / MICRO_USDC,
+        "total_usdc": total / MICRO_USDC
+    }
+
+
 # ==================== STREAM ENDPOINTS ====================
 
 @app.get("/streams", response_model=List[StreamResponse])
-async def list_streams(db: Session = next(get_db())):
+async def list_streams(db: Session = Depends(get_read_db)):
     """List all available streams"""
 
     streams = db.query(Stream).filter(Stream.is_active == True).all()
@@ -185,7 +264,7 @@ async def purchase_ticket(
 
 
 @app.get("/tickets/{ticket_id}", response_model=TicketResponse)
-async def get_ticket(ticket_id: str, db: Session = next(get_db())):
+async def get_ticket(ticket_id: str, db: Session = Depends(get_read_db)):
     """Get ticket information"""
 
     ticket = db.query(Ticket).filter(Ticket.ticket_id == ticket_id).first()
@@ -199,12 +278,30 @@ async def get_ticket(ticket_id: str, db: Session = next(get_db())):
 
 @app.websocket("/tickets/{ticket_id}/watch")
 async def watch_stream(websocket: WebSocket, ticket_id: str):
-    """WebSocket for live stream monitoring"""
+    """WebSocket for live stream monitoring
+
+    Clients push frames by default. With ?mode=pull the server reads the
+    ticket's stream_url itself and pushes analyzed keyframes instead.
+    Sockets with no messages in either direction for ws_idle_timeout_seconds
+    are evicted as idle; the server's {"type": "ping"} messages don't count.
+
+    ?ack_interval_ms=N and/or ?ack_every=N switch per-frame frame_processed
+    messages to one cumulative frames_ack per window.
+    """
 
     await websocket.accept()
 
+    pull_mode = websocket.query_params.get("mode") == "pull"
+    try:
+        ack_interval_ms = min(max(int(websocket.query_params.get("ack_interval_ms", 0)), 0), 10000)
+        ack_every = min(max(int(websocket.query_params.get("ack_every", 1)), 1), 10000)
+    except ValueError:
+        await websocket.close(code=1008, reason="Invalid ack parameters")
+        return
+
+    # Admission check only; the session is released before the long-lived loop
+    db = read_session(websocket, settings.replica_sticky_seconds)
     try:
-        db = SessionLocal()
         ticket = db.query(Ticket).filter(Ticket.ticket_id == ticket_id).first()
 
         if not ticket:
@@ -215,48 +312,123 @@ async def watch_stream(websocket: WebSocket, ticket_id: str):
             await websocket.close(code=1008, reason="Ticket not active")
             return
 
-        await websocket.send_json({
+        if ticket.expires_at and ticket.expires_at <= datetime.utcnow():
+            await websocket.close(code=1008, reason="Ticket expired")
+            return
+
+        stream_url = ticket.stream_url
+        agent_id = ticket.agent_id
+        expires_at = ticket.expires_at
+    finally:
+        db.close()
+
+    conn = await connection_manager.connect(websocket, ticket_id, agent_id)
+    if conn is None:
+        return
+
+    profile = profiler.for_ticket(ticket_id)
+    if profile is not None:
+        profiler.attach(profile)
+
+    ingest_queue = None
+    forwarder = None
+    session = None
+    acker = FrameAcker(conn.send, interval_seconds=ack_interval_ms / 1000, every=ack_every)
+    expiry_timer = None
+
+    if expires_at:
+        def on_ticket_expired():
+            acker.flush()
+            conn.send({"type": "ticket_expired", "expires_at": expires_at.isoformat()})
+            connection_manager.close_later(conn, 1008, "Ticket expired")
+
+        expiry_timer = ticket_expiry.schedule(expires_at, on_ticket_expired)
+
+    try:
+        conn.send({
             "type": "connected",
             "message": "Watching stream",
-            "stream_url": ticket.stream_url
+            "stream_url": stream_url,
+            "mode": "pull" if pull_mode else "push",
+            "ack": {"interval_ms": ack_interval_ms, "every": ack_every}
         })
 
         # Simulate stream monitoring
-        frames_processed = 0
-        total_cost = 0.0
+        session = WatchSession(
+            ticket_id,
+            agent_id=agent_id,
+            stream_url=stream_url,
+            recorder=SessionLogWriter.for_ticket(ticket_id),
+            ledger=spend_ledger
+        )
 
-        while True:
+        if pull_mode:
+            ingest_queue = await ingest_service.subscribe(stream_url)
+            if ingest_queue is None:
+                await conn.close(code=1013, reason="Stream ingest at capacity")
+                return
+
+            async def forward_analyses():
+                while True:
+                    result = await ingest_queue.get()
+
+                    if result is None:
+                        acker.flush()
+                        conn.send(session.ended())
+                        await conn.close()
+                        return
+
+                    if "frame_number" not in result:
+                        conn.send({
+                            "type": "ingest_error",
+                            "error": result.get("error")
+                        })
+                        continue
+
+                    acker.ack(session.frame_processed(
+                        result["cost_usdc"],
+                        timestamp=result["timestamp"],
+                        analysis=result["analysis"]
+                    ))
+
+            forwarder = asyncio.create_task(forward_analyses())
+            if profile is not None:
+                profiler.attach(profile, forwarder)
+
+        while not conn.closed:
             # Wait for WebSocket message (would receive frames in production)
-            data = await websocket.receive_json()
+            data = await conn.receive_json()
 
-            if data.get("type") == "frame":
-                # Process frame with Trio API (mock for now)
-                frames_processed += 1
+            if data.get("type") == "frame" and not pull_mode:
+                session.frame_received(data)
 
-                # Cost per frame
+                # Process frame with Trio API (mock for now)
                 frame_cost = 0.001
-                total_cost += frame_cost
-
-                await websocket.send_json({
-                    "type": "frame_processed",
-                    "frame_number": frames_processed,
-                    "cost_usdc": frame_cost,
-                    "total_cost_usdc": total_cost
-                })
+                acker.ack(session.frame_processed(frame_cost))
 
             elif data.get("type") == "end_stream":
                 # Generate digest
-                await websocket.send_json({
-                    "type": "stream_ended",
-                    "frames_processed": frames_processed,
-                    "total_cost_usdc": total_cost
-                })
-                break
+                acker.flush()
+                conn.send(session.ended())
+                await conn.close()
 
     except WebSocketDisconnect:
         pass
     finally:
-        db.close()
+        if profile is not None:
+            profiler.detach()
+            if forwarder is not None:
+                profiler.detach(forwarder)
+        if forwarder is not None:
+            forwarder.cancel()
+        if ingest_queue is not None:
+            ingest_service.unsubscribe(stream_url, ingest_queue)
+        if expiry_timer is not None:
+            expiry_timer.cancel()
+        acker.close()
+        connection_manager.disconnect(conn)
+        if session is not None:
+            session.close()
 
 
 # ==================== DIGEST ENDPOINTS ====================
@@ -287,6 +459,8 @@ async def create_digest(digest_data: DigestCreate, db: Session = next(get_db()))
     )
 
     db.add(digest)
+    db.flush()
+    index_digest(db, digest.digest_id)
     db.commit()
     db.refresh(digest)
 
@@ -314,8 +488,37 @@ async def create_digest(digest_data: DigestCreate, db: Session = next(get_db()))
     return digest
 
 
+@app.get("/digests/search", response_model=DigestSearchResponse)
+async def search_digest_archive(
+    q: str = Query(..., min_length=1),
+    agent_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_read_db)
+):
+    """Full-text search over digest summaries and key insights"""
+
+    matches, total = search_digests(
+        db, q,
+        agent_id=agent_id,
+        since=since,
+        until=until,
+        limit=limit,
+        offset=offset
+    )
+
+    results = [
+        DigestSearchResult(**DigestResponse.model_validate(digest).model_dump(), score=score)
+        for digest, score in matches
+    ]
+
+    return {"results": results, "total": total, "limit": limit, "offset": offset}
+
+
 @app.get("/digests/{digest_id}", response_model=DigestResponse)
-async def get_digest(digest_id: str, db: Session = next(get_db())):
+async def get_digest(digest_id: str, db: Session = Depends(get_read_db)):
     """Get digest information"""
 
     digest = db.query(Digest).filter(Digest.digest_id == digest_id).first()
@@ -325,6 +528,27 @@ async def get_digest(digest_id: str, db: Session = next(get_db())):
     return digest
 
 
+# ==================== PROFILING ====================
+
+@app.post("/admin/profiles/tickets/{ticket_id}", dependencies=[Depends(require_profiling_token)])
+async def profile_ticket(ticket_id: str, seconds: float = Query(60.0, gt=0, le=3600)):
+    """Sample watch sockets for a ticket that connect within `seconds`"""
+
+    profile = profiler.profile_ticket(ticket_id, seconds)
+    return {"profile_id": profile.profile_id, "ticket_id": ticket_id, "seconds": seconds}
+
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_profiling_token)])
+async def get_profile(profile_id: str):
+    """Collapsed stacks for a profile, ready for flamegraph.pl or speedscope"""
+
+    profile = profiler.profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    return PlainTextResponse(profile.collapsed())
+
+
 # ==================== HEALTH & INFO ====================
 
 @app.get("/")
@@ -346,10 +570,11 @@ async def health():
     return {
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
-        "environment": settings.environment
+        "environment": settings.environment,
+        "watch_connections": connection_manager.stats()
     }
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host="0.0.0.0", port=8000, ws_max_size=settings.ws_max_message_bytes)
@@ -0,0 +1,226 @@
+import asyncio
+import hmac
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from api.config import settings
+
+PROFILE_HEADER = "x-clawnema-profile"
+
+
+class RequestCosts:
+    """Time spent in the DB and in upstream HTTP calls by one request"""
+
+    __slots__ = ("db_seconds", "db_queries", "upstream_seconds", "upstream_calls")
+
+    def __init__(self):
+        self.db_seconds = 0.0
+        self.db_queries = 0
+        self.upstream_seconds = 0.0
+        self.upstream_calls = 0
+
+
+_costs: ContextVar[Optional[RequestCosts]] = ContextVar("request_costs", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _costs.get() is not None and context is not None:
+        # Per statement, so a query that raises leaves nothing behind on the pooled connection
+        context._profile_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    costs = _costs.get()
+    started = getattr(context, "_profile_started", None)
+    if costs is not None and started is not None:
+        costs.db_seconds += time.perf_counter() - started
+        costs.db_queries += 1
+
+
+async def _on_upstream_request(request: httpx.Request) -> None:
+    if _costs.get() is not None:
+        request.extensions["profile_started"] = time.perf_counter()
+
+
+async def _on_upstream_response(response: httpx.Response) -> None:
+    costs = _costs.get()
+    started = response.request.extensions.get("profile_started")
+    if costs is not None and started is not None:
+        costs.upstream_seconds += time.perf_counter() - started
+        costs.upstream_calls += 1
+
+
+# Pass as httpx.AsyncClient(event_hooks=upstream_hooks) for upstream timing
+upstream_hooks = {"request": [_on_upstream_request], "response": [_on_upstream_response]}
+
+
+class Profile:
+    def __init__(self, profile_id: str, expires_at: Optional[float] = None):
+        self.profile_id = profile_id
+        self.expires_at = expires_at
+        self.samples: Counter = Counter()
+
+    def collapsed(self) -> str:
+        """Folded stacks, one 'frame;frame;frame count' per line (flamegraph.pl, speedscope)"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class SamplingProfiler:
+    """Samples the event loop thread and attributes stacks to profiled tasks
+
+    While any task is attached, a daemon thread wakes every interval and,
+    if the task running on the loop belongs to an active profile, records
+    its stack. With nothing attached the thread blocks on an event and
+    does not wake at all.
+    """
+
+    def __init__(self):
+        self.interval = settings.profiling_interval_ms / 1000
+        self.max_profiles = settings.profiling_max_profiles
+        self.profiles: "OrderedDict[str, Profile]" = OrderedDict()
+        self._tasks: Dict[asyncio.Task, Profile] = {}
+        self._tickets: Dict[str, Profile] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._sampler: Optional[threading.Thread] = None
+        self._active = threading.Event()
+
+    def begin(self, profile_id: Optional[str] = None, seconds: Optional[float] = None) -> Profile:
+        profile = Profile(
+            profile_id or uuid.uuid4().hex[:16],
+            time.monotonic() + seconds if seconds else None
+        )
+        self.profiles[profile.profile_id] = profile
+        while len(self.profiles) > self.max_profiles:
+            self.profiles.popitem(last=False)
+        return profile
+
+    def attach(self, profile: Profile, task: Optional[asyncio.Task] = None) -> None:
+        """Sample `task` (default: the current one) into `profile`"""
+        task = task or asyncio.current_task()
+        self._tasks[task] = profile
+        self._active.set()
+        self._ensure_sampler()
+
+    def detach(self, task: Optional[asyncio.Task] = None) -> None:
+        self._tasks.pop(task or asyncio.current_task(), None)
+        if not self._tasks:
+            self._active.clear()
+
+    def profile_ticket(self, ticket_id: str, seconds: float) -> Profile:
+        """Profile watch sockets for this ticket that connect in the next `seconds`"""
+        profile = self.begin(f"ticket-{ticket_id}-{uuid.uuid4().hex[:8]}", seconds)
+        self._tickets[ticket_id] = profile
+        return profile
+
+    def for_ticket(self, ticket_id: str) -> Optional[Profile]:
+        profile = self._tickets.get(ticket_id)
+        if profile is not None and profile.expires_at is not None and time.monotonic() > profile.expires_at:
+            del self._tickets[ticket_id]
+            return None
+        return profile
+
+    def _ensure_sampler(self) -> None:
+        if self._sampler is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._sampler = threading.Thread(target=self._sample_forever, name="clawnema-profiler", daemon=True)
+        self._sampler.start()
+
+    def _sample_forever(self) -> None:
+        while True:
+            self._active.wait()
+            time.sleep(self.interval)
+
+            task = asyncio.current_task(self._loop)
+            profile = self._tasks.get(task) if task is not None else None
+            if profile is None:
+                continue
+            if profile.expires_at is not None and time.monotonic() > profile.expires_at:
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                profile.samples[";".join(reversed(stack))] += 1
+
+
+profiler = SamplingProfiler()
+
+
+def profiling_authorized(token: Optional[str]) -> bool:
+    """Profiling is off unless PROFILING_TOKEN is set and matched"""
+    return bool(settings.profiling_token) and token is not None and hmac.compare_digest(
+        token.encode(), settings.profiling_token.encode()
+    )
+
+
+class ProfilingMiddleware:
+    """Profiles requests that carry a valid X-Clawnema-Profile header
+
+    The response gets a Server-Timing header that splits the request into
+    db, upstream, cpu and total time. CPU is the event loop thread's CPU
+    time, so it includes other requests interleaved with this one. The
+    X-Profile-Id header names the sampled stacks, which can be fetched from
+    /admin/profiles/{id}.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = dict(scope["headers"]).get(PROFILE_HEADER.encode())
+        if token is None or not profiling_authorized(token.decode("latin-1")):
+            await self.app(scope, receive, send)
+            return
+
+        costs = RequestCosts()
+        reset = _costs.set(costs)
+        profile = profiler.begin()
+        profiler.attach(profile)
+        wall_started = time.perf_counter()
+        cpu_started = time.thread_time()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                total = time.perf_counter() - wall_started
+                cpu = time.thread_time() - cpu_started
+                timing = (
+                    f'db;dur={costs.db_seconds * 1000:.2f};desc="{costs.db_queries} queries", '
+                    f'upstream;dur={costs.upstream_seconds * 1000:.2f};desc="{costs.upstream_calls} calls", '
+                    f"cpu;dur={cpu * 1000:.2f}, "
+                    f"total;dur={total * 1000:.2f}"
+                )
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timing.encode()))
+                headers.append((b"x-profile-id", profile.profile_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            profiler.detach()
+            _costs.reset(reset)
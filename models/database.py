@@ -1,13 +1,164 @@
-from sqlalchemy import create_engine, Column, String, DateTime, Float, Text, Boolean, JSON
+from sqlalchemy import create_engine, event, text, Column, String, DateTime, Float, Text, Boolean, JSON, BigInteger, Integer, Index
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from contextvars import ContextVar
 from datetime import datetime
+from typing import List, Optional
+import asyncio
+import logging
+import random
+import time
 import uuid
 
 from api.config import settings
 
+logger = logging.getLogger(__name__)
+
 engine = create_engine(settings.database_url)
+
+
+def _create_replica_engine(url: str) -> Engine:
+    connect_args = {}
+    if make_url(url).get_backend_name() == "postgresql":
+        # Bound the health probe when a replica host stops answering
+        connect_args["connect_timeout"] = settings.replica_connect_timeout_seconds
+    return create_engine(url, connect_args=connect_args)
+
+
+replica_engines = [
+    _create_replica_engine(url.strip())
+    for url in settings.database_replica_urls.split(",")
+    if url.strip()
+]
+
+
+class ReplicaRouter:
+    """Picks a bind for reads: a fresh-enough replica, or the primary
+
+    Replica lag is probed by a background task; choosing a bind never
+    touches the network. Until the first probe finishes, reads use the
+    primary.
+    """
+
+    def __init__(
+        self,
+        primary: Engine,
+        replicas: List[Engine],
+        max_lag_seconds: float,
+        check_interval_seconds: float
+    ):
+        self.primary = primary
+        self.replicas = replicas
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval_seconds = check_interval_seconds
+        self._healthy: List[Engine] = []
+        self._prober: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.replicas and self._prober is None:
+            self._prober = asyncio.create_task(self._probe_forever())
+
+    def stop(self) -> None:
+        if self._prober is not None:
+            self._prober.cancel()
+            self._prober = None
+
+    def choose(self) -> Engine:
+        healthy = self._healthy
+        return random.choice(healthy) if healthy else self.primary
+
+    async def _probe_forever(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                lags = await asyncio.gather(*(
+                    loop.run_in_executor(None, self._lag, replica)
+                    for replica in self.replicas
+                ))
+                self._healthy = [
+                    replica for replica, lag in zip(self.replicas, lags)
+                    if lag <= self.max_lag_seconds
+                ]
+            except Exception:
+                # Lag unknown: read from the primary until a probe succeeds
+                logger.exception("Replica lag probe failed")
+                self._healthy = []
+            await asyncio.sleep(self.check_interval_seconds)
+
+    def _lag(self, replica: Engine) -> float:
+        """Replication delay in seconds; unreachable replicas count as infinite"""
+        if replica.dialect.name != "postgresql":
+            return 0.0
+
+        try:
+            with replica.connect() as conn:
+                lag = conn.execute(text(
+                    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+                    "THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+                )).scalar()
+        except SQLAlchemyError:
+            return float("inf")
+
+        return float(lag or 0.0)
+
+
+router = ReplicaRouter(
+    engine,
+    replica_engines,
+    max_lag_seconds=settings.replica_max_lag_seconds,
+    check_interval_seconds=settings.replica_check_interval_seconds
+)
+
+
+class RoutingSession(Session):
+    """Session that sends ORM reads to replicas and everything else to the primary"""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or mapper is None:
+            return engine
+        return router.choose()
+
+
+class RequestWrites:
+    """Wall-clock time of the last commit that wrote rows during one request"""
+
+    __slots__ = ("written_at",)
+
+    def __init__(self):
+        self.written_at: Optional[float] = None
+
+
+# Set per request by api.consistency.ReadYourWritesMiddleware
+request_writes: ContextVar[Optional[RequestWrites]] = ContextVar("request_writes", default=None)
+
+
+@event.listens_for(Session, "after_flush")
+def _note_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _note_bulk_write(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_write(session):
+    session.info.pop("wrote", None)
+
+
+@event.listens_for(Session, "after_commit")
+def _record_request_write(session):
+    writes = request_writes.get()
+    if session.info.pop("wrote", False) and writes is not None:
+        writes.written_at = time.time()
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, class_=RoutingSession)
 Base = declarative_base()
 
 
@@ -40,6 +191,10 @@ class Ticket(Base):
     expires_at = Column(DateTime)
 
 
+# Serves the bulk expiry sweep: WHERE status = 'active' AND expires_at <= now
+ticket_expiry_index = Index("ix_tickets_status_expires_at", Ticket.status, Ticket.expires_at)
+
+
 class Digest(Base):
     __tablename__ = "digests"
 
@@ -69,3 +224,42 @@ class Stream(Base):
     ticket_price_usdc = Column(Float, default=0.10)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class PooledWallet(Base):
+    __tablename__ = "wallet_pool"
+
+    id = Column(String, primary_key=True, index=True)
+    wallet_address = Column(String, unique=True, nullable=False)
+    claimed_by = Column(String, index=True)  # agent_id, null while available
+    created_at = Column(DateTime, default=datetime.utcnow)
+    claimed_at = Column(DateTime)
+
+
+class SpendLedgerEntry(Base):
+    __tablename__ = "spend_ledger"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    agent_id = Column(String, nullable=False)
+    stream_url = Column(String)
+    ticket_id = Column(String)
+    kind = Column(String, nullable=False)  # trio_frame, ticket_purchase
+    amount_micro_usdc = Column(BigInteger, nullable=False)
+    day = Column(String, nullable=False)  # YYYY-MM-DD (UTC)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_spend_ledger_agent_day", "agent_id", "day"),
+        Index("ix_spend_ledger_stream_day", "stream_url", "day"),
+    )
+
+
+class SpendRollup(Base):
+    __tablename__ = "spend_rollups"
+
+    # scope is "agent" or "stream"; day is YYYY-MM-DD or "all" for lifetime
+    scope = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    day = Column(String, primary_key=True)
+    total_micro_usdc = Column(BigInteger, nullable=False, default=0)
+    entries = Column(BigInteger, nullable=False, default=0)
@@ -25,6 +25,14 @@ class AgentResponse(BaseModel):
         from_attributes = True
 
 
+class AgentSpendResponse(BaseModel):
+    agent_id: str
+    today_micro_usdc: int
+    total_micro_usdc: int
+    today_usdc: float
+    total_usdc: float
+
+
 # Ticket
 class TicketPurchaseRequest(BaseModel):
     agent_id: str
@@ -77,6 +85,17 @@ class DigestResponse(BaseModel):
         from_attributes = True
 
 
+class DigestSearchResult(DigestResponse):
+    score: float
+
+
+class DigestSearchResponse(BaseModel):
+    results: List[DigestSearchResult]
+    total: int
+    limit: int
+    offset: int
+
+
 # Stream
 class StreamCreate(BaseModel):
     stream_url: HttpUrl
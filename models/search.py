@@ -0,0 +1,133 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import String, and_, cast, column, func, literal, literal_column, or_, table, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from models.database import Digest
+
+# SQLite keeps a separate FTS5 table keyed by digest_id; Postgres stores a
+# tsvector column on digests itself with a GIN index over it.
+digests_fts = table("digests_fts", column("digest_id"), column("rank"))
+search_vector = literal_column("digests.search_vector")
+
+POSTGRES_VECTOR = (
+    "to_tsvector('english', coalesce(summary, '') || ' ' || "
+    "coalesce(key_insights::text, ''))"
+)
+
+
+def create_digest_search_index(engine: Engine) -> None:
+    """Create the digest full-text index and backfill any unindexed rows"""
+
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS digests_fts USING fts5("
+                "digest_id UNINDEXED, summary, key_insights, tokenize='porter')"
+            ))
+            conn.execute(text(
+                "INSERT INTO digests_fts (digest_id, summary, key_insights) "
+                "SELECT digest_id, summary, key_insights FROM digests "
+                "WHERE digest_id NOT IN (SELECT digest_id FROM digests_fts)"
+            ))
+        elif engine.dialect.name == "postgresql":
+            conn.execute(text(
+                "ALTER TABLE digests ADD COLUMN IF NOT EXISTS search_vector tsvector"
+            ))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_digests_search_vector "
+                "ON digests USING GIN (search_vector)"
+            ))
+            conn.execute(text(
+                f"UPDATE digests SET search_vector = {POSTGRES_VECTOR} "
+                "WHERE search_vector IS NULL"
+            ))
+
+
+def index_digest(db: Session, digest_id: str) -> None:
+    """Add one flushed digest to the index inside the caller's transaction"""
+
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        db.execute(text(
+            "INSERT INTO digests_fts (digest_id, summary, key_insights) "
+            "SELECT digest_id, summary, key_insights FROM digests "
+            "WHERE digest_id = :digest_id"
+        ), {"digest_id": digest_id})
+    elif dialect == "postgresql":
+        db.execute(text(
+            f"UPDATE digests SET search_vector = {POSTGRES_VECTOR} "
+            "WHERE digest_id = :digest_id"
+        ), {"digest_id": digest_id})
+
+
+def _fts5_query(query: str) -> str:
+    """Quote each term so user input can't use FTS5 query syntax"""
+    terms = query.split()
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def _like_patterns(query: str) -> List[str]:
+    """One %term% pattern per word, with LIKE wildcards escaped"""
+    return [
+        "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        for term in query.split()
+    ]
+
+
+def search_digests(
+    db: Session,
+    query: str,
+    agent_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 20,
+    offset: int = 0
+) -> Tuple[List[Tuple[Digest, float]], int]:
+    """Ranked digest search; returns ((digest, score) page, total matches)
+
+    Higher scores are better on every backend. Databases without a
+    full-text index fall back to unranked substring matching.
+    """
+
+    if not query.strip():
+        return [], 0
+
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        score = -digests_fts.c.rank  # bm25: lower is better
+        q = (
+            db.query(Digest, score)
+            .join(digests_fts, digests_fts.c.digest_id == Digest.digest_id)
+            .filter(text("digests_fts MATCH :query"))
+            .params(query=_fts5_query(query))
+        )
+    elif dialect == "postgresql":
+        ts_query = func.websearch_to_tsquery("english", query)
+        score = func.ts_rank_cd(search_vector, ts_query)
+        q = db.query(Digest, score).filter(search_vector.op("@@")(ts_query))
+    else:
+        score = literal(0.0)
+        q = db.query(Digest, score).filter(and_(*(
+            or_(
+                Digest.summary.ilike(pattern, escape="\\"),
+                cast(Digest.key_insights, String).ilike(pattern, escape="\\")
+            )
+            for pattern in _like_patterns(query)
+        )))
+
+    if agent_id:
+        q = q.filter(Digest.agent_id == agent_id)
+    if since:
+        q = q.filter(Digest.created_at >= since)
+    if until:
+        q = q.filter(Digest.created_at < until)
+
+    total = q.count()
+    rows = q.order_by(score.desc(), Digest.created_at.desc()).limit(limit).offset(offset).all()
+
+    return [(digest, float(rank)) for digest, rank in rows], total
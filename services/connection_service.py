@@ -0,0 +1,208 @@
+import asyncio
+import json
+import time
+from typing import Any, Dict, Optional, Set
+
+from fastapi import WebSocket
+
+from api.config import settings
+
+# Close codes (RFC 6455)
+CLOSE_NORMAL = 1000
+CLOSE_GOING_AWAY = 1001
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_MESSAGE_TOO_BIG = 1009
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class WatchConnection:
+    """One live watch socket with a byte-bounded outbound queue"""
+
+    def __init__(self, manager: "ConnectionManager", websocket: WebSocket, ticket_id: str, agent_id: str):
+        self.manager = manager
+        self.websocket = websocket
+        self.ticket_id = ticket_id
+        self.agent_id = agent_id
+        self.connected_at = time.monotonic()
+        self.last_activity = self.connected_at
+        self.pending_bytes = 0
+        self.closed = False
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._handler = asyncio.current_task()
+        self._sender = asyncio.create_task(self._drain())
+
+    def send(self, message: Dict[str, Any], activity: bool = True) -> bool:
+        """Queue a JSON message; evicts the socket if it can't keep up
+
+        Delivering a message with activity set counts as traffic for idle
+        eviction, the same as receiving one.
+        """
+        if self.closed:
+            return False
+
+        payload = json.dumps(message)
+        if self.pending_bytes + len(payload) > self.manager.send_buffer_bytes:
+            self.manager.evict(self, CLOSE_TRY_AGAIN_LATER, "Slow consumer", "slow")
+            return False
+
+        self.pending_bytes += len(payload)
+        self._queue.put_nowait((payload, activity))
+        return True
+
+    async def receive_json(self) -> Dict[str, Any]:
+        """Receive one JSON message, enforcing the inbound size limit
+
+        The server's ws_max_size is what bounds per-socket memory, since the
+        message is fully buffered by the time it gets here. This check is a
+        fallback for servers started without it.
+        """
+        text = await self.websocket.receive_text()
+        self.last_activity = time.monotonic()
+
+        if len(text) > self.manager.max_message_bytes:
+            self.manager.evict(self, CLOSE_MESSAGE_TOO_BIG, "Message too big", "oversized")
+            return {}
+
+        return json.loads(text)
+
+    async def close(self, code: int = CLOSE_NORMAL, reason: str = "", flush_timeout: float = 5.0) -> None:
+        """Flush queued messages, then close the socket"""
+        if self.closed:
+            return
+        self.closed = True
+
+        try:
+            await asyncio.wait_for(self._queue.join(), flush_timeout)
+        except asyncio.TimeoutError:
+            pass
+        await self._shutdown(code, reason)
+
+    async def _shutdown(self, code: int, reason: str) -> None:
+        self.closed = True
+        self._sender.cancel()
+
+        try:
+            await asyncio.wait_for(
+                self.websocket.close(code=code, reason=reason),
+                self.manager.close_timeout
+            )
+        except (asyncio.TimeoutError, RuntimeError):
+            # Peer never completed the close handshake; stop waiting on it
+            if self._handler is not None and not self._handler.done():
+                self._handler.cancel()
+
+    async def _drain(self) -> None:
+        while True:
+            payload, activity = await self._queue.get()
+            try:
+                await self.websocket.send_text(payload)
+                if activity:
+                    self.last_activity = time.monotonic()
+            finally:
+                self.pending_bytes -= len(payload)
+                self._queue.task_done()
+
+
+class ConnectionManager:
+    """Tracks live watch sockets and enforces caps, heartbeats and idle eviction
+
+    Limits are per worker process. A single sweeper task pings every socket
+    and evicts ones with no traffic either way, so there is no per-socket
+    timer. Our own pings don't count as traffic. Dead peers are detected
+    by the server's protocol-level ping/pong (uvicorn ws_ping_interval and
+    ws_ping_timeout), not by requiring clients to reply.
+    """
+
+    def __init__(self):
+        self.max_connections = settings.ws_max_connections
+        self.max_per_agent = settings.ws_max_connections_per_agent
+        self.ping_interval = settings.ws_ping_interval_seconds
+        self.idle_timeout = settings.ws_idle_timeout_seconds
+        self.send_buffer_bytes = settings.ws_send_buffer_bytes
+        self.max_message_bytes = settings.ws_max_message_bytes
+        self.close_timeout = 5.0
+        self._connections: Dict[int, WatchConnection] = {}
+        self._per_agent: Dict[str, int] = {}
+        self._evicted: Dict[str, int] = {}
+        self._rejected = 0
+        self._sweeper: Optional[asyncio.Task] = None
+        self._closing: Set[asyncio.Task] = set()
+
+    async def connect(self, websocket: WebSocket, ticket_id: str, agent_id: str) -> Optional[WatchConnection]:
+        """Register an accepted socket, or close it and return None if over a cap"""
+        if len(self._connections) >= self.max_connections:
+            reason = "Server at connection capacity"
+        elif self._per_agent.get(agent_id, 0) >= self.max_per_agent:
+            reason = "Too many connections for agent"
+        else:
+            reason = None
+
+        if reason:
+            self._rejected += 1
+            await websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason=reason)
+            return None
+
+        conn = WatchConnection(self, websocket, ticket_id, agent_id)
+        self._connections[id(conn)] = conn
+        self._per_agent[agent_id] = self._per_agent.get(agent_id, 0) + 1
+
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep())
+
+        return conn
+
+    def disconnect(self, conn: WatchConnection) -> None:
+        """Forget a connection; safe to call more than once"""
+        if self._connections.pop(id(conn), None) is None:
+            return
+
+        conn.closed = True
+        conn._sender.cancel()
+
+        remaining = self._per_agent.get(conn.agent_id, 0) - 1
+        if remaining > 0:
+            self._per_agent[conn.agent_id] = remaining
+        else:
+            self._per_agent.pop(conn.agent_id, None)
+
+    def evict(self, conn: WatchConnection, code: int, reason: str, cause: str) -> None:
+        """Close a misbehaving socket without waiting for its queued messages"""
+        if conn.closed:
+            return
+        conn.closed = True
+        self._evicted[cause] = self._evicted.get(cause, 0) + 1
+        self._track(asyncio.create_task(conn._shutdown(code, reason)))
+
+    def close_later(self, conn: WatchConnection, code: int, reason: str) -> None:
+        """Flush and close a socket from synchronous code, e.g. a timer callback"""
+        self._track(asyncio.create_task(conn.close(code=code, reason=reason)))
+
+    def _track(self, task: asyncio.Task) -> None:
+        # The loop only holds tasks weakly; keep closes alive until they finish
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def stats(self) -> Dict[str, Any]:
+        """Live counts for this worker"""
+        return {
+            "connections": len(self._connections),
+            "agents": len(self._per_agent),
+            "max_connections": self.max_connections,
+            "pending_bytes": sum(c.pending_bytes for c in self._connections.values()),
+            "rejected": self._rejected,
+            "evicted": dict(self._evicted)
+        }
+
+    async def _sweep(self) -> None:
+        while self._connections:
+            await asyncio.sleep(self.ping_interval)
+            now = time.monotonic()
+
+            for conn in list(self._connections.values()):
+                if now - conn.last_activity > self.idle_timeout:
+                    self.evict(conn, CLOSE_GOING_AWAY, "Idle timeout", "idle")
+                else:
+                    conn.send({"type": "ping"}, activity=False)
+
+
+connection_manager = ConnectionManager()
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import math
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from sqlalchemy import select
+
+from api.config import settings
+from models.database import SessionLocal, Ticket, engine, ticket_expiry_index
+
+logger = logging.getLogger(__name__)
+
+
+class WheelTimer:
+    __slots__ = ("callback", "rounds", "cancelled")
+
+    def __init__(self, callback: Callable[[], None], rounds: int):
+        self.callback = callback
+        self.rounds = rounds
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class TimingWheel:
+    """Hashed timing wheel: O(1) schedule/cancel, one ticker for all timers
+
+    Deadlines are rounded up to the next tick. Timers further out than one
+    revolution wait in their slot for the extra rounds.
+    """
+
+    def __init__(self, tick_seconds: float, slots: int):
+        self.tick_seconds = tick_seconds
+        self._slots: List[List[WheelTimer]] = [[] for _ in range(slots)]
+        self._cursor = 0
+        self._ticker: Optional[asyncio.Task] = None
+
+    def schedule(self, delay_seconds: float, callback: Callable[[], None]) -> WheelTimer:
+        ticks = max(1, math.ceil(delay_seconds / self.tick_seconds))
+        slots = len(self._slots)
+        timer = WheelTimer(callback, (ticks - 1) // slots)
+        self._slots[(self._cursor + ticks) % slots].append(timer)
+        return timer
+
+    def start(self) -> None:
+        if self._ticker is None:
+            self._ticker = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._ticker is not None:
+            self._ticker.cancel()
+            self._ticker = None
+
+    def advance(self) -> None:
+        """Move one tick and fire everything due in the new slot"""
+        self._cursor = (self._cursor + 1) % len(self._slots)
+        slot = self._slots[self._cursor]
+        if not slot:
+            return
+
+        waiting = []
+        for timer in slot:
+            if timer.cancelled:
+                continue
+            if timer.rounds > 0:
+                timer.rounds -= 1
+                waiting.append(timer)
+            else:
+                try:
+                    timer.callback()
+                except Exception:
+                    # One bad callback must not stop the ticker for every other timer
+                    logger.exception("Timing wheel callback failed")
+        self._slots[self._cursor] = waiting
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            next_tick += self.tick_seconds
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            self.advance()
+
+
+class TicketExpiryService:
+    """Flips expired tickets in bulk and closes live sessions on expiry"""
+
+    def __init__(self):
+        self.sweep_interval = settings.ticket_expiry_sweep_interval_seconds
+        self.batch_size = settings.ticket_expiry_batch_size
+        self.wheel = TimingWheel(
+            settings.expiry_wheel_tick_seconds,
+            settings.expiry_wheel_slots
+        )
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        # Existing deployments predate the index; create_all won't add it
+        ticket_expiry_index.create(bind=engine, checkfirst=True)
+        self.wheel.start()
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    def stop(self) -> None:
+        self.wheel.stop()
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+    def schedule(self, expires_at: datetime, on_expire: Callable[[], None]) -> WheelTimer:
+        """Call on_expire once expires_at (naive UTC) has passed"""
+        delay = (expires_at - datetime.utcnow()).total_seconds()
+        return self.wheel.schedule(delay, on_expire)
+
+    def expire_tickets(self, now: Optional[datetime] = None) -> int:
+        """Mark active tickets past expires_at as expired, batch_size rows per UPDATE"""
+        now = now or datetime.utcnow()
+        expired = 0
+
+        db = SessionLocal()
+        try:
+            while True:
+                due = (
+                    select(Ticket.id)
+                    .where(Ticket.status == "active", Ticket.expires_at <= now)
+                    .limit(self.batch_size)
+                )
+                count = (
+                    db.query(Ticket)
+                    .filter(Ticket.id.in_(due.scalar_subquery()))
+                    .update({"status": "expired"}, synchronize_session=False)
+                )
+                db.commit()
+
+                expired += count
+                if count < self.batch_size:
+                    return expired
+        finally:
+            db.close()
+
+    async def _sweep_forever(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.expire_tickets)
+            except Exception:
+                # Retried on the next sweep
+                logger.exception("Ticket expiry sweep failed")
+            await asyncio.sleep(self.sweep_interval)
+
+
+ticket_expiry = TicketExpiryService()
@@ -0,0 +1,40 @@
+# Runs inside preprocessing pool workers. Those start via forkserver/spawn
+# and import this module fresh, so it must not import the app (api.*).
+import io
+from typing import Optional, Tuple
+
+CropBox = Tuple[int, int, int, int]
+
+
+def preprocess_frame(
+    image_data: bytes,
+    max_size: int,
+    quality: int,
+    crop: Optional[CropBox] = None
+) -> Optional[bytes]:
+    """Crop, downscale and recompress one frame to JPEG (runs in a worker process)
+
+    Returns None when the frame can't be decoded or cropped, or when
+    recompressing would not make it smaller.
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(image_data)) as image:
+            if crop:
+                image = image.crop(crop)
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            image.thumbnail((max_size, max_size))
+
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    except (OSError, ValueError, SyntaxError, Image.DecompressionBombError):
+        # Undecodable data, a bad crop box or an oversized image
+        return None
+
+    processed = buffer.getvalue()
+    # Never upload more than the client sent unless we had to crop
+    if crop is None and len(processed) >= len(image_data):
+        return None
+    return processed
@@ -0,0 +1,203 @@
+import asyncio
+import io
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Set, Tuple
+
+import httpx
+
+from api.config import settings
+from services.trio_service import trio_service
+
+# FFmpeg protocols a stream URL, and anything its playlist references, may
+# use. Keeps agent-supplied HLS/concat inputs from reading local files.
+STREAM_PROTOCOLS = "http,https,tls,tcp,crypto"
+
+
+class StreamIngestService:
+    """Server-side reader that pulls a stream_url and analyzes its keyframes
+
+    One reader runs per stream URL no matter how many tickets are watching
+    it; every subscriber gets the same analysis results.
+    """
+
+    def __init__(self):
+        self.keyframes_only = settings.ingest_keyframes_only
+        self.sample_fps = settings.ingest_sample_fps
+        self.queue_size = settings.ingest_queue_size
+        self.protocols = STREAM_PROTOCOLS + (",file" if settings.ingest_allow_local_files else "")
+        self.max_readers = settings.ingest_max_readers
+        self.timeout = (settings.ingest_open_timeout_seconds, settings.ingest_read_timeout_seconds)
+        self._readers: Dict[str, asyncio.Task] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        # Decoder threads whose reader gave up on them but that haven't exited
+        self._abandoned: Set[threading.Thread] = set()
+        self._threads_lock = threading.Lock()
+
+    def iter_frames(self, stream_url: str) -> Iterator[Tuple[float, bytes]]:
+        """Yield (timestamp_seconds, jpeg_bytes) from an HLS/MP4 URL
+
+        Local files are only readable with INGEST_ALLOW_LOCAL_FILES set.
+
+        Blocking; run it off the event loop. Only keyframes are decoded when
+        keyframes_only is set, and frames are thinned to sample_fps.
+        """
+        try:
+            import av
+        except ImportError as exc:
+            raise RuntimeError("Stream ingestion requires the 'av' package") from exc
+
+        min_interval = 1.0 / self.sample_fps if self.sample_fps > 0 else 0.0
+        last_ts: Optional[float] = None
+
+        with av.open(
+            stream_url,
+            options={"protocol_whitelist": self.protocols},
+            timeout=self.timeout
+        ) as container:
+            video = container.streams.video[0]
+            if self.keyframes_only:
+                # Decoder drops every non-key packet without reconstructing it
+                video.codec_context.skip_frame = "NONKEY"
+
+            for frame in container.decode(video):
+                if frame.pts is None or frame.time_base is None:
+                    continue
+                ts = float(frame.pts * frame.time_base)
+                if last_ts is not None and ts - last_ts < min_interval:
+                    continue
+                last_ts = ts
+
+                buffer = io.BytesIO()
+                frame.to_image().save(buffer, format="JPEG", quality=85)
+                yield ts, buffer.getvalue()
+
+    async def read_frames(self, stream_url: str) -> AsyncIterator[Tuple[float, bytes]]:
+        """Async view of iter_frames, decoded in its own thread with backpressure
+
+        The decoder gets a dedicated daemon thread rather than a slot in the
+        loop's default executor, so a stalled stream can't starve other
+        executor work. Closing the iterator doesn't wait for that thread: a
+        decoder blocked in FFmpeg notices the stop once its read times out.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        slots = threading.Semaphore(self.queue_size)
+        stop = threading.Event()
+        exited = threading.Event()
+        done = object()
+
+        def deliver(item: Any) -> None:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # Loop already closed; nobody is listening
+                stop.set()
+
+        def produce():
+            try:
+                for item in self.iter_frames(stream_url):
+                    # Wait for the consumer to make room, unless it has gone
+                    while not slots.acquire(timeout=0.5):
+                        if stop.is_set():
+                            return
+                    if stop.is_set():
+                        return
+                    deliver(item)
+            except Exception as exc:
+                deliver(exc)
+            finally:
+                deliver(done)
+                with self._threads_lock:
+                    exited.set()
+                    self._abandoned.discard(threading.current_thread())
+
+        worker = threading.Thread(target=produce, name="clawnema-ingest", daemon=True)
+        worker.start()
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                slots.release()
+                yield item
+        finally:
+            stop.set()
+            with self._threads_lock:
+                if not exited.is_set():
+                    self._abandoned.add(worker)
+
+    def at_capacity(self) -> bool:
+        """True when no new stream can start without exceeding max_readers"""
+        with self._threads_lock:
+            return len(self._readers) + len(self._abandoned) >= self.max_readers
+
+    async def subscribe(self, stream_url: str) -> Optional[asyncio.Queue]:
+        """Subscribe to analysis results, starting the reader if needed
+
+        The queue receives dicts per analyzed frame and None when the
+        stream ends. Returns None when starting a new reader would exceed
+        max_readers; streams already being read can always be joined.
+        """
+        if stream_url not in self._readers and self.at_capacity():
+            return None
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(stream_url, set()).add(queue)
+
+        if stream_url not in self._readers:
+            self._readers[stream_url] = asyncio.create_task(self._run_reader(stream_url))
+
+        return queue
+
+    def unsubscribe(self, stream_url: str, queue: asyncio.Queue) -> None:
+        """Drop a subscriber; the reader stops once nobody is left"""
+        subscribers = self._subscribers.get(stream_url)
+        if subscribers is None:
+            return
+
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[stream_url]
+            reader = self._readers.pop(stream_url, None)
+            if reader is not None:
+                reader.cancel()
+
+    async def _run_reader(self, stream_url: str) -> None:
+        frame_cost = await trio_service.get_cost_estimate(["visual"])
+        frame_number = 0
+
+        try:
+            async for ts, image_data in self.read_frames(stream_url):
+                frame_number += 1
+                try:
+                    analysis = await trio_service.analyze_visual(image_data)
+                    cost = frame_cost
+                except httpx.HTTPError as exc:
+                    # Nothing was analyzed, so subscribers are not charged for the frame
+                    analysis = {"error": str(exc)}
+                    cost = 0.0
+
+                self._publish(stream_url, {
+                    "frame_number": frame_number,
+                    "timestamp": ts,
+                    "cost_usdc": cost,
+                    "analysis": analysis
+                })
+        except Exception as exc:
+            self._publish(stream_url, {"error": str(exc)})
+        finally:
+            if self._readers.get(stream_url) is asyncio.current_task():
+                del self._readers[stream_url]
+            self._publish(stream_url, None)
+
+    def _publish(self, stream_url: str, message: Optional[Dict[str, Any]]) -> None:
+        for queue in self._subscribers.get(stream_url, ()):
+            if queue.full():
+                # Slow subscribers lose the oldest result rather than stall the reader
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+
+ingest_service = StreamIngestService()
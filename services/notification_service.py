@@ -2,6 +2,7 @@ import httpx
 from typing import Dict, Any
 
 from api.config import settings
+from api.profiling import upstream_hooks
 
 
 class NotificationService:
@@ -29,7 +30,7 @@ class NotificationService:
         }
 
         # Send via OpenClaw messaging API
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_hooks) as client:
             response = await client.post(
                 "https://api.openclaw.ai/v1/notifications/send",
                 headers={
@@ -97,7 +98,7 @@ Your agent ({agent_id}) has made a payment:
             "type": "payment_confirmation"
         }
 
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_hooks) as client:
             response = await client.post(
                 "https://api.openclaw.ai/v1/notifications/send",
                 headers={
@@ -1,8 +1,9 @@
 import httpx
-from typing import Optional
+from typing import Any, Dict, Optional
 import uuid
 
 from api.config import settings
+from api.profiling import upstream_hooks
 
 
 class X402PaymentService:
@@ -36,7 +37,7 @@ class X402PaymentService:
         }
 
         # Create payment request with facilitator
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_hooks) as client:
             response = await client.post(
                 f"{self.facilitator_url}/payment/create",
                 headers={
@@ -53,7 +54,7 @@ class X402PaymentService:
     async def verify_payment(self, payment_id: str) -> Dict[str, Any]:
         """Verify if payment was settled"""
 
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_hooks) as client:
             response = await client.get(
                 f"{self.facilitator_url}/payment/{payment_id}/verify",
                 headers={
@@ -74,7 +75,7 @@ class X402PaymentService:
             "wallet_address": wallet_address
         }
 
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_hooks) as client:
             response = await client.post(
                 "https://api.cdp.coinbase.com/wallets/balance",
                 headers={
@@ -99,7 +100,7 @@ class X402PaymentService:
             }
         }
 
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_hooks) as client:
             response = await client.post(
                 "https://api.cdp.coinbase.com/wallets/agentic",
                 headers={
@@ -0,0 +1,81 @@
+import asyncio
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from api.config import settings
+from services.frame_worker import CropBox, preprocess_frame
+
+
+def _pool_context() -> multiprocessing.context.BaseContext:
+    """Start method for pool workers; never fork
+
+    By the time the pool starts this process already runs other threads
+    (executor, profiler, ingest readers), and a forked child could inherit
+    a lock one of them held.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+
+class FramePreprocessor:
+    """Shrinks frames to Trio's effective input size off the event loop"""
+
+    def __init__(self):
+        self.enabled = (
+            settings.preprocess_enabled
+            and importlib.util.find_spec("PIL") is not None
+        )
+        self.workers = settings.preprocess_workers or None
+        self.max_pending = settings.preprocess_max_pending
+        self.max_size = settings.trio_max_image_size
+        self.quality = settings.trio_jpeg_quality
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+
+    async def process(self, image_data: bytes, crop: Optional[CropBox] = None) -> bytes:
+        """Return a resized, recompressed copy of image_data
+
+        When disabled, or when max_pending frames are already queued, the
+        frame is returned untouched instead of piling up behind the pool.
+        Frames that fail to preprocess are passed through as-is too.
+        """
+        if not self.enabled or self._pending >= self.max_pending:
+            return image_data
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_pool_context())
+
+        executor = self._executor
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            processed = await loop.run_in_executor(
+                executor,
+                preprocess_frame,
+                image_data,
+                self.max_size,
+                self.quality,
+                crop
+            )
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); start a fresh pool on the next frame
+            if self._executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            return image_data
+        finally:
+            self._pending -= 1
+
+        return processed if processed is not None else image_data
+
+    def shutdown(self) -> None:
+        """Stop worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+frame_preprocessor = FramePreprocessor()
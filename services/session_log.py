@@ -0,0 +1,239 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+import uuid
+from typing import Any, Dict, Iterator, NamedTuple, Optional
+
+from api.config import settings
+from services.connection_service import ConnectionManager, WatchConnection
+from services.preprocess_service import frame_preprocessor
+from services.trio_service import trio_service
+from services.watch_service import FrameAcker, WatchSession
+
+# File layout: MAGIC, then records of HEADER + payload, append-only.
+# HEADER = kind (u8), frame_number (u32), unix time (f64), payload length (u32)
+MAGIC = b"CLAWLOG1"
+HEADER = struct.Struct("<BIdI")
+
+RECORD_FRAME = 1        # raw inbound frame
+RECORD_FRAME_HASH = 2   # sha256 of an inbound frame
+RECORD_ANALYSIS = 3     # JSON: cost_usdc plus any analyze_* response
+RECORD_END = 4          # stream_ended
+
+GROW_BYTES = 1 << 20
+
+
+class LogRecord(NamedTuple):
+    kind: int
+    frame_number: int
+    timestamp: float
+    payload: bytes
+
+
+class SessionLogWriter:
+    """Append-only, memory-mapped log of one watch session
+
+    The file is grown in chunks and mapped, so appending a record is a
+    memory copy. A crash leaves zero padding after the last record, which
+    readers treat as end of log.
+    """
+
+    def __init__(self, path: str, keep_frames: bool = False):
+        self.path = path
+        self.keep_frames = keep_frames
+        self._file = open(path, "w+b")
+        self._file.truncate(GROW_BYTES)
+        self._mm = mmap.mmap(self._file.fileno(), GROW_BYTES)
+        self._mm[:len(MAGIC)] = MAGIC
+        self._offset = len(MAGIC)
+
+    @classmethod
+    def for_ticket(cls, ticket_id: str) -> Optional["SessionLogWriter"]:
+        """New log under session_log_dir/<ticket_id>/, or None when disabled"""
+        if not settings.session_log_dir:
+            return None
+
+        directory = os.path.join(settings.session_log_dir, ticket_id)
+        os.makedirs(directory, exist_ok=True)
+        name = f"{int(time.time())}-{uuid.uuid4().hex[:8]}.clog"
+        return cls(os.path.join(directory, name), keep_frames=settings.session_log_frames)
+
+    def record_frame(self, frame_number: int, frame: bytes) -> None:
+        if self.keep_frames:
+            self._append(RECORD_FRAME, frame_number, frame)
+        else:
+            self._append(RECORD_FRAME_HASH, frame_number, hashlib.sha256(frame).digest())
+
+    def record_analysis(self, frame_number: int, analysis: Dict[str, Any]) -> None:
+        payload = json.dumps(analysis, separators=(",", ":")).encode()
+        self._append(RECORD_ANALYSIS, frame_number, payload)
+
+    def record_end(self, frame_number: int) -> None:
+        self._append(RECORD_END, frame_number, b"")
+
+    def close(self) -> None:
+        """Flush and trim the file to the bytes actually written"""
+        if self._mm.closed:
+            return
+        self._mm.flush()
+        self._mm.close()
+        self._file.truncate(self._offset)
+        self._file.close()
+
+    def _append(self, kind: int, frame_number: int, payload: bytes) -> None:
+        end = self._offset + HEADER.size + len(payload)
+        if end > len(self._mm):
+            self._mm.resize(max(end, len(self._mm) + GROW_BYTES))
+
+        HEADER.pack_into(self._mm, self._offset, kind, frame_number, time.time(), len(payload))
+        self._mm[self._offset + HEADER.size:end] = payload
+        self._offset = end
+
+
+def read_session_log(path: str) -> Iterator[LogRecord]:
+    """Iterate the records of a session log"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size <= len(MAGIC):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a session log")
+
+            offset = len(MAGIC)
+            while offset + HEADER.size <= len(mm):
+                kind, frame_number, timestamp, length = HEADER.unpack_from(mm, offset)
+                if kind == 0:
+                    break  # zero padding left by an unclean shutdown
+
+                start = offset + HEADER.size
+                yield LogRecord(kind, frame_number, timestamp, mm[start:start + length])
+                offset = start + length
+
+
+class _NullSocket:
+    """Stands in for the client's WebSocket during replay; counts what it is sent"""
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    async def send_text(self, text: str) -> None:
+        self.messages += 1
+        self.bytes += len(text)
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        pass
+
+
+async def replay_session(
+    path: str,
+    reanalyze: bool = False,
+    preprocess: bool = False,
+    ack_interval_ms: int = 0,
+    ack_every: int = 1
+) -> Dict[str, Any]:
+    """Re-run the watch pipeline over a session log as fast as possible
+
+    Each recorded frame goes through the same path as on the live socket:
+    WatchSession accounting, FrameAcker (with the given ack settings) and
+    WatchConnection's send queue, drained into a null socket. Kept frames
+    carrying an image are run through the preprocessing pool when
+    preprocess is set, and sent to Trio again (which also preprocesses)
+    when reanalyze is set; otherwise the recorded analyses are reused.
+
+    Not covered: the network socket itself, inbound JSON parsing and the
+    database. frames_per_second is only a pipeline benchmark when those
+    are the parts that didn't change.
+    """
+    session = WatchSession(ticket_id=os.path.basename(os.path.dirname(path)))
+    sink = _NullSocket()
+    manager = ConnectionManager()
+    conn = WatchConnection(manager, sink, session.ticket_id, session.agent_id or "replay")
+    acker = FrameAcker(conn.send, interval_seconds=ack_interval_ms / 1000, every=ack_every)
+    analyses = []
+    pending_frame: Optional[bytes] = None
+    started = time.perf_counter()
+
+    try:
+        for record in read_session_log(path):
+            if record.kind == RECORD_FRAME:
+                pending_frame = record.payload
+
+            elif record.kind == RECORD_ANALYSIS:
+                fields = json.loads(record.payload)
+                cost = fields.pop("cost_usdc")
+
+                image = json.loads(pending_frame).get("image") if pending_frame is not None else None
+                pending_frame = None
+                if image and reanalyze:
+                    fields["analysis"] = await trio_service.analyze_visual(base64.b64decode(image))
+                elif image and preprocess:
+                    await frame_preprocessor.process(base64.b64decode(image))
+
+                acker.ack(session.frame_processed(cost, **fields))
+                if "analysis" in fields:
+                    analyses.append(fields["analysis"])
+
+                # The live handler yields on every receive; let the sender drain likewise
+                await asyncio.sleep(0)
+
+            elif record.kind == RECORD_END:
+                break
+
+        acker.flush()
+        conn.send(session.ended())
+        await conn.close()
+    finally:
+        acker.close()
+
+    elapsed = time.perf_counter() - started
+    result = session.ended()
+    result.update({
+        "analyses": analyses,
+        "messages_sent": sink.messages,
+        "bytes_sent": sink.bytes,
+        "evicted": manager.stats()["evicted"],
+        "elapsed_seconds": elapsed,
+        "frames_per_second": session.frames_processed / elapsed if elapsed else 0.0
+    })
+    return result
+
+
+async def regenerate_digest(path: str, reanalyze: bool = False) -> Dict[str, Any]:
+    """Produce a Trio digest from a recorded session without live traffic"""
+    replay = await replay_session(path, reanalyze=reanalyze)
+    return await trio_service.generate_digest({"visual": {"frames": replay["analyses"]}})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a Clawnema watch session log")
+    parser.add_argument("path")
+    parser.add_argument("--reanalyze", action="store_true", help="call Trio again for recorded frames")
+    parser.add_argument(
+        "--preprocess", action="store_true",
+        help="run kept frames through the preprocessing pool (implied by --reanalyze)"
+    )
+    parser.add_argument("--ack-interval-ms", type=int, default=0, help="coalesce acks per window, as ?ack_interval_ms")
+    parser.add_argument("--ack-every", type=int, default=1, help="coalesce acks every N frames, as ?ack_every")
+    parser.add_argument("--digest", action="store_true", help="regenerate the digest via Trio")
+    args = parser.parse_args()
+
+    if args.digest:
+        output = asyncio.run(regenerate_digest(args.path, reanalyze=args.reanalyze))
+    else:
+        output = asyncio.run(replay_session(
+            args.path,
+            reanalyze=args.reanalyze,
+            preprocess=args.preprocess,
+            ack_interval_ms=args.ack_interval_ms,
+            ack_every=args.ack_every
+        ))
+        frame_preprocessor.shutdown()
+        output.pop("analyses")
+    print(json.dumps(output, indent=2))
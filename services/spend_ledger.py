@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from api.config import settings
+from models.database import SessionLocal, SpendLedgerEntry, SpendRollup
+
+MICRO_USDC = 1_000_000
+ALL_TIME = "all"
+
+# (scope, key, day)
+RollupKey = Tuple[str, str, str]
+
+
+def to_micro_usdc(amount_usdc: float) -> int:
+    return int(round(amount_usdc * MICRO_USDC))
+
+
+class SpendLedger:
+    """Append-only integer spend ledger with incrementally maintained rollups
+
+    Entries are buffered per worker and written in batches. Each batch
+    inserts its ledger rows and adds its deltas to the per-agent and
+    per-stream rollups, daily and lifetime, in one transaction. Spend
+    queries are primary-key lookups on the rollups plus this worker's
+    unflushed deltas; they wait out a flush in progress so a batch is never
+    counted both in the rollups and as unflushed.
+    """
+
+    def __init__(self):
+        self.batch_size = settings.ledger_batch_size
+        self.flush_interval = settings.ledger_flush_interval_seconds
+        self._buffer: List[Dict] = []
+        self._pending: Dict[RollupKey, Tuple[int, int]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    def start(self) -> None:
+        if self._flusher is None:
+            self._wake = asyncio.Event()
+            self._flusher = asyncio.create_task(self._flush_forever())
+
+    async def stop(self) -> None:
+        """Stop the flusher and write whatever is still buffered"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+
+    def record(
+        self,
+        agent_id: str,
+        kind: str,
+        amount_usdc: float,
+        stream_url: Optional[str] = None,
+        ticket_id: Optional[str] = None
+    ) -> None:
+        """Buffer one spend entry; cheap enough to call per frame"""
+        amount = to_micro_usdc(amount_usdc)
+        now = datetime.utcnow()
+        day = now.strftime("%Y-%m-%d")
+
+        self._buffer.append({
+            "agent_id": agent_id,
+            "stream_url": stream_url,
+            "ticket_id": ticket_id,
+            "kind": kind,
+            "amount_micro_usdc": amount,
+            "day": day,
+            "created_at": now
+        })
+
+        for key in _rollup_keys(agent_id, stream_url, day):
+            total, entries = self._pending.get(key, (0, 0))
+            self._pending[key] = (total + amount, entries + 1)
+
+        if len(self._buffer) >= self.batch_size and self._wake is not None:
+            self._wake.set()
+
+    async def spent(self, db: Session, scope: str, key: str, day: str = ALL_TIME) -> int:
+        """Micro-USDC spent by an agent or stream on a day (or ALL_TIME)"""
+        # Holding the flush lock means no batch is between "taken from
+        # _pending" and "committed to the rollups"
+        async with self._lock():
+            rollup = db.get(SpendRollup, (scope, key, day))
+            stored = rollup.total_micro_usdc if rollup else 0
+            return stored + self._pending.get((scope, key, day), (0, 0))[0]
+
+    async def spent_today(self, db: Session, agent_id: str) -> int:
+        return await self.spent(db, "agent", agent_id, datetime.utcnow().strftime("%Y-%m-%d"))
+
+    def _lock(self) -> asyncio.Lock:
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        return self._flush_lock
+
+    async def flush(self) -> None:
+        async with self._lock():
+            if not self._buffer:
+                return
+
+            batch, self._buffer = self._buffer, []
+            deltas, self._pending = self._pending, {}
+
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(None, _write_batch, batch, deltas)
+            except Exception:
+                # Put the batch back in front so nothing is lost
+                self._buffer = batch + self._buffer
+                for key, (total, entries) in deltas.items():
+                    pending_total, pending_entries = self._pending.get(key, (0, 0))
+                    self._pending[key] = (pending_total + total, pending_entries + entries)
+                raise
+
+    async def _flush_forever(self) -> None:
+        """Flush every flush_interval, or as soon as a full batch is buffered"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            # Cleared first so a batch filled during the write wakes the next round
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                # Retried on the next tick
+                pass
+
+
+def _rollup_keys(agent_id: str, stream_url: Optional[str], day: str) -> List[RollupKey]:
+    keys = [("agent", agent_id, day), ("agent", agent_id, ALL_TIME)]
+    if stream_url:
+        keys += [("stream", stream_url, day), ("stream", stream_url, ALL_TIME)]
+    return keys
+
+
+def _upsert_rollup(db: Session, key: RollupKey, total: int, entries: int) -> None:
+    scope, rollup_key, day = key
+    dialect = db.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+
+    stmt = insert(SpendRollup).values(
+        scope=scope, key=rollup_key, day=day,
+        total_micro_usdc=total, entries=entries
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["scope", "key", "day"],
+        set_={
+            "total_micro_usdc": SpendRollup.total_micro_usdc + stmt.excluded.total_micro_usdc,
+            "entries": SpendRollup.entries + stmt.excluded.entries
+        }
+    ))
+
+
+def _write_batch(batch: List[Dict], deltas: Dict[RollupKey, Tuple[int, int]]) -> None:
+    db = SessionLocal()
+    try:
+        db.bulk_insert_mappings(SpendLedgerEntry, batch)
+        # Sorted so concurrent workers lock rollup rows in the same order
+        for key in sorted(deltas):
+            total, entries = deltas[key]
+            _upsert_rollup(db, key, total, entries)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def reconcile(db: Session, fix: bool = False) -> List[Dict]:
+    """Compare every rollup with a full sum over the ledger
+
+    Returns the mismatches; with fix=True the rollups are overwritten with
+    the ledger totals.
+    """
+    expected: Dict[RollupKey, Tuple[int, int]] = {}
+
+    def add(key: RollupKey, total: int, entries: int) -> None:
+        prev_total, prev_entries = expected.get(key, (0, 0))
+        expected[key] = (prev_total + total, prev_entries + entries)
+
+    rows = (
+        db.query(
+            SpendLedgerEntry.agent_id,
+            SpendLedgerEntry.stream_url,
+            SpendLedgerEntry.day,
+            func.sum(SpendLedgerEntry.amount_micro_usdc),
+            func.count()
+        )
+        .group_by(SpendLedgerEntry.agent_id, SpendLedgerEntry.stream_url, SpendLedgerEntry.day)
+    )
+    for agent_id, stream_url, day, total, entries in rows:
+        for key in _rollup_keys(agent_id, stream_url, day):
+            add(key, int(total), int(entries))
+
+    actual = {
+        (r.scope, r.key, r.day): (r.total_micro_usdc, r.entries)
+        for r in db.query(SpendRollup)
+    }
+
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        want = expected.get(key, (0, 0))
+        have = actual.get(key, (0, 0))
+        if want != have:
+            scope, rollup_key, day = key
+            mismatches.append({
+                "scope": scope, "key": rollup_key, "day": day,
+                "ledger_micro_usdc": want[0], "rollup_micro_usdc": have[0],
+                "ledger_entries": want[1], "rollup_entries": have[1]
+            })
+            if fix:
+                db.merge(SpendRollup(
+                    scope=scope, key=rollup_key, day=day,
+                    total_micro_usdc=want[0], entries=want[1]
+                ))
+
+    if fix:
+        db.commit()
+    return mismatches
+
+
+spend_ledger = SpendLedger()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check spend rollups against the ledger")
+    parser.add_argument("--fix", action="store_true", help="overwrite drifted rollups")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        problems = reconcile(session, fix=args.fix)
+    finally:
+        session.close()
+
+    for problem in problems:
+        print(problem)
+    print(f"{len(problems)} mismatched rollup(s)")
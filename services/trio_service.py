@@ -3,6 +3,8 @@ from typing import List, Dict, Any, Optional
 import base64
 
 from api.config import settings
+from api.profiling import upstream_hooks
+from services.preprocess_service import CropBox, frame_preprocessor
 
 
 class TrioService:
@@ -16,8 +18,13 @@ class TrioService:
             "Content-Type": "application/json"
         }
 
-    async def analyze_visual(self, image_data: bytes) -> Dict[str, Any]:
-        """Analyze visual content from image data"""
+    async def analyze_visual(
+        self,
+        image_data: bytes,
+        crop: Optional[CropBox] = None
+    ) -> Dict[str, Any]:
+        """Analyze visual content from image data, optionally cropped to a box"""
+        image_data = await frame_preprocessor.process(image_data, crop=crop)
         image_b64 = base64.b64encode(image_data).decode()
 
         payload = {
@@ -25,7 +32,7 @@ class TrioService:
             "tasks": ["scene_detection", "object_recognition", "person_tracking"]
         }
 
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_hooks) as client:
             response = await client.post(
                 f"{self.base_url}/analyze/visual",
                 headers=self.headers,
@@ -44,7 +51,7 @@ class TrioService:
             "tasks": ["speech_detection", "music_classification", "sentiment"]
         }
 
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_hooks) as client:
             response = await client.post(
                 f"{self.base_url}/analyze/audio",
                 headers=self.headers,
@@ -61,7 +68,7 @@ class TrioService:
             "tasks": ["sentiment_analysis", "entity_extraction", "topic_classification"]
         }
 
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_hooks) as client:
             response = await client.post(
                 f"{self.base_url}/analyze/text",
                 headers=self.headers,
@@ -80,7 +87,7 @@ class TrioService:
             "format": "summary"
         }
 
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_hooks) as client:
             response = await client.post(
                 f"{self.base_url}/digest/generate",
                 headers=self.headers,
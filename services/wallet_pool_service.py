@@ -0,0 +1,125 @@
+import asyncio
+import uuid
+from datetime import datetime
+from typing import Optional
+
+import httpx
+from sqlalchemy.orm import Session
+
+from api.config import settings
+from models.database import SessionLocal, PooledWallet
+from services.payment_service import x402_service
+
+
+class WalletPoolService:
+    """Keeps pre-created agentic wallets ready so registration skips Coinbase CDP"""
+
+    def __init__(self):
+        self.size = settings.wallet_pool_size
+        self.refill_concurrency = settings.wallet_pool_refill_concurrency
+        self.refill_interval = settings.wallet_pool_refill_interval_seconds
+        self._refiller: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    def start(self) -> None:
+        """Start the background refiller (no-op when the pool is disabled)"""
+        if self.size <= 0 or self._refiller is not None:
+            return
+        self._wake = asyncio.Event()
+        self._refiller = asyncio.create_task(self._refill_forever())
+
+    def stop(self) -> None:
+        if self._refiller is not None:
+            self._refiller.cancel()
+            self._refiller = None
+
+    def claim(self, db: Session, agent_id: str) -> Optional[str]:
+        """Claim an unused wallet for agent_id in the caller's transaction
+
+        Returns None when the pool is empty. The conditional UPDATE makes the
+        claim atomic across workers; a lost race just tries the next wallet.
+        """
+        for _ in range(3):
+            wallet = (
+                db.query(PooledWallet)
+                .filter(PooledWallet.claimed_by.is_(None))
+                .order_by(PooledWallet.created_at)
+                .first()
+            )
+            if wallet is None:
+                break
+
+            claimed = (
+                db.query(PooledWallet)
+                .filter(PooledWallet.id == wallet.id, PooledWallet.claimed_by.is_(None))
+                .update(
+                    {"claimed_by": agent_id, "claimed_at": datetime.utcnow()},
+                    synchronize_session=False
+                )
+            )
+            if claimed:
+                if self._wake is not None:
+                    self._wake.set()
+                return wallet.wallet_address
+
+        if self._wake is not None:
+            self._wake.set()
+        return None
+
+    def available(self, db: Session) -> int:
+        return db.query(PooledWallet).filter(PooledWallet.claimed_by.is_(None)).count()
+
+    async def refill(self) -> int:
+        """Top the pool up to size; returns how many wallets were created"""
+        db = SessionLocal()
+        try:
+            missing = self.size - self.available(db)
+        finally:
+            db.close()
+
+        if missing <= 0:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.refill_concurrency)
+
+        async def create_one() -> Optional[str]:
+            async with semaphore:
+                try:
+                    wallet = await x402_service.create_agentic_wallet(
+                        f"pool_{uuid.uuid4().hex[:12]}"
+                    )
+                except httpx.HTTPError:
+                    return None
+                return wallet.get("wallet_address")
+
+        addresses = await asyncio.gather(*(create_one() for _ in range(missing)))
+        addresses = [address for address in addresses if address]
+
+        db = SessionLocal()
+        try:
+            for address in addresses:
+                db.add(PooledWallet(id=str(uuid.uuid4()), wallet_address=address))
+            db.commit()
+        finally:
+            db.close()
+
+        return len(addresses)
+
+    async def _refill_forever(self) -> None:
+        while True:
+            # Cleared before refilling so claims made during the CDP calls
+            # wake the next round instead of being lost
+            self._wake.clear()
+            try:
+                await self.refill()
+            except Exception:
+                # Keep the refiller alive through CDP or DB hiccups
+                pass
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+wallet_pool = WalletPoolService()
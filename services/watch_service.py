@@ -0,0 +1,158 @@
+import asyncio
+import json
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from services.session_log import SessionLogWriter
+    from services.spend_ledger import SpendLedger
+
+
+class WatchSession:
+    """Frame accounting for one watch session
+
+    Used by the live watch socket and by the session log replay driver, so
+    both produce the same messages.
+    """
+
+    def __init__(
+        self,
+        ticket_id: str,
+        agent_id: Optional[str] = None,
+        stream_url: Optional[str] = None,
+        recorder: Optional["SessionLogWriter"] = None,
+        ledger: Optional["SpendLedger"] = None
+    ):
+        self.ticket_id = ticket_id
+        self.agent_id = agent_id
+        self.stream_url = stream_url
+        self.recorder = recorder
+        self.ledger = ledger
+        self.frames_processed = 0
+        self.total_cost = 0.0
+
+    def frame_received(self, message: Dict[str, Any]) -> None:
+        """Note an inbound frame message before it is processed"""
+        if self.recorder is not None:
+            frame = json.dumps(message, separators=(",", ":")).encode()
+            self.recorder.record_frame(self.frames_processed + 1, frame)
+
+    def frame_processed(self, cost_usdc: float, **fields: Any) -> Dict[str, Any]:
+        """Account for one processed frame and build its frame_processed message
+
+        Extra fields (timestamp, analysis, ...) are recorded and passed through.
+        """
+        self.frames_processed += 1
+        self.total_cost += cost_usdc
+
+        if self.recorder is not None:
+            self.recorder.record_analysis(
+                self.frames_processed,
+                {"cost_usdc": cost_usdc, **fields}
+            )
+        if self.ledger is not None and cost_usdc:
+            self.ledger.record(
+                self.agent_id,
+                "trio_frame",
+                cost_usdc,
+                stream_url=self.stream_url,
+                ticket_id=self.ticket_id
+            )
+
+        return {
+            "type": "frame_processed",
+            "frame_number": self.frames_processed,
+            **fields,
+            "cost_usdc": cost_usdc,
+            "total_cost_usdc": self.total_cost
+        }
+
+    def ended(self) -> Dict[str, Any]:
+        """Build the stream_ended message"""
+        if self.recorder is not None:
+            self.recorder.record_end(self.frames_processed)
+
+        return {
+            "type": "stream_ended",
+            "frames_processed": self.frames_processed,
+            "total_cost_usdc": self.total_cost
+        }
+
+    def close(self) -> None:
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+
+class FrameAcker:
+    """Sends frame_processed acks one at a time or coalesced per window
+
+    In coalescing mode one frames_ack message covers a contiguous frame
+    range. It carries the cost delta for the window, the running total and
+    any analysis results. A window closes after `every` frames or
+    `interval_seconds`, whichever comes first.
+    """
+
+    def __init__(self, send: Callable[[Dict[str, Any]], Any], interval_seconds: float = 0.0, every: int = 1):
+        self.send = send
+        self.interval_seconds = interval_seconds
+        self.every = every
+        self.coalescing = interval_seconds > 0 or every > 1
+        self._first: Optional[int] = None
+        self._last = 0
+        self._count = 0
+        self._cost = 0.0
+        self._total = 0.0
+        self._results: List[Dict[str, Any]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def ack(self, message: Dict[str, Any]) -> None:
+        if not self.coalescing:
+            self.send(message)
+            return
+
+        if self._first is None:
+            self._first = message["frame_number"]
+            if self.interval_seconds > 0:
+                self._timer = asyncio.get_running_loop().call_later(self.interval_seconds, self.flush)
+
+        self._last = message["frame_number"]
+        self._count += 1
+        self._cost += message["cost_usdc"]
+        self._total = message["total_cost_usdc"]
+
+        if "analysis" in message:
+            result = {"frame_number": message["frame_number"], "analysis": message["analysis"]}
+            if "timestamp" in message:
+                result["timestamp"] = message["timestamp"]
+            self._results.append(result)
+
+        if self.every > 1 and self._count >= self.every:
+            self.flush()
+
+    def flush(self) -> None:
+        """Send the open window, if any"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._first is None:
+            return
+
+        ack: Dict[str, Any] = {
+            "type": "frames_ack",
+            "frames": [self._first, self._last],
+            "cost_usdc": self._cost,
+            "total_cost_usdc": self._total
+        }
+        if self._results:
+            ack["results"] = self._results
+
+        self._first = None
+        self._count = 0
+        self._cost = 0.0
+        self._results = []
+        self.send(ack)
+
+    def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None